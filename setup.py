@@ -0,0 +1,20 @@
+import setuptools
+
+# The compiled MaxWalkSat walk used by the native MLN engine is optional.
+# It is only built when Cython is available (and is skipped if it fails to compile, e.g. without a C compiler),
+# otherwise the pure Python walk is used.
+extensions = [
+    setuptools.Extension('srli.engine.mln._walksat', ['src/srli/engine/mln/_walksat.pyx']),
+]
+
+try:
+    import Cython.Build
+    ext_modules = Cython.Build.cythonize(extensions, language_level = 3)
+except ImportError:
+    ext_modules = []
+
+# cythonize() does not carry over the optional flag.
+for extension in ext_modules:
+    extension.optional = True
+
+setuptools.setup(ext_modules = ext_modules)
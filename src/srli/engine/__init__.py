@@ -3,6 +3,7 @@ import enum
 class Engine(enum.Enum):
     Logic_Weighted_Discrete = 'Logic_Weighted_Discrete'
     MLN_Native = 'MLN_Native'
+    MLN_Numba = 'MLN_Numba'
     MLN_PySAT = 'MLN_PySAT'
     ProbLog = 'ProbLog'
     ProbLog_NonCollective = 'ProbLog_NonCollective'
@@ -16,6 +17,8 @@ def load(engine_type):
         return _load_logic_weighted_discrete()
     elif (engine_type == Engine.MLN_Native):
         return _load_mln_native()
+    elif (engine_type == Engine.MLN_Numba):
+        return _load_mln_numba()
     elif (engine_type == Engine.MLN_PySAT):
         return _load_mln_pysat()
     elif (engine_type == Engine.ProbLog):
@@ -41,6 +44,10 @@ def _load_mln_native():
     import srli.engine.mln.native
     return srli.engine.mln.native.NativeMLN
 
+def _load_mln_numba():
+    import srli.engine.mln.numba
+    return srli.engine.mln.numba.NumbaMLN
+
 def _load_mln_pysat():
     import srli.engine.mln.pysat
     return srli.engine.mln.pysat.PySATMLN
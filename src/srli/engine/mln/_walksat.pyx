@@ -0,0 +1,169 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+
+"""
+A compiled version of the NativeMLN MaxWalkSat walk (see NativeMLN._inference_attempt()).
+The rule and atom arrays are the ones from NativeMLN._flatten_rules() and NativeMLN._index_atoms(),
+passed as typed buffers (array.array).
+Randomness is drawn from the engine's random.Random, so the walk matches the Python walk for the same seed.
+"""
+
+from libc.stdlib cimport malloc, free
+
+def walksat(const int[:] rule_atoms, const int[:] rule_atom_ptr, const int[:] rule_coefs, const double[:] rule_weights,
+        const long long[:] rule_min_sums, const long long[:] rule_max_sums,
+        const int[:] atom_rules, const int[:] atom_rule_ptr, const int[:] atom_rule_coefs,
+        unsigned char[:] atom_values, long max_flips, double noise, object rng, int attempt, long log_mod):
+    """
+    Run a single MaxWalkSat attempt, flipping atom_values in place.
+    Progress is logged the same way as the Python walk.
+
+    Returns:
+        (total loss of the final atom values, final flip)
+    """
+
+    cdef Py_ssize_t num_rules = rule_weights.shape[0]
+    cdef Py_ssize_t size = num_rules if num_rules > 0 else 1
+
+    cdef long long *rule_sums = <long long *> malloc(size * sizeof(long long))
+    cdef double *rule_losses = <double *> malloc(size * sizeof(double))
+    cdef int *unsat_rules = <int *> malloc(size * sizeof(int))
+    cdef int *unsat_positions = <int *> malloc(size * sizeof(int))
+    cdef long final_flip = 1
+    cdef double total_loss
+
+    try:
+        if (rule_sums == NULL or rule_losses == NULL or unsat_rules == NULL or unsat_positions == NULL):
+            raise MemoryError()
+
+        total_loss = _walk(rule_atoms, rule_atom_ptr, rule_coefs, rule_weights, rule_min_sums, rule_max_sums,
+                atom_rules, atom_rule_ptr, atom_rule_coefs, atom_values, max_flips, noise, rng, attempt, log_mod,
+                rule_sums, rule_losses, unsat_rules, unsat_positions, &final_flip)
+
+        return total_loss, final_flip
+    finally:
+        free(rule_sums)
+        free(rule_losses)
+        free(unsat_rules)
+        free(unsat_positions)
+
+cdef double _walk(const int[:] rule_atoms, const int[:] rule_atom_ptr, const int[:] rule_coefs, const double[:] rule_weights,
+        const long long[:] rule_min_sums, const long long[:] rule_max_sums,
+        const int[:] atom_rules, const int[:] atom_rule_ptr, const int[:] atom_rule_coefs,
+        unsigned char[:] atom_values, long max_flips, double noise, object rng, int attempt, long log_mod,
+        long long *rule_sums, double *rule_losses, int *unsat_rules, int *unsat_positions, long *final_flip) except? -1.0:
+    cdef Py_ssize_t num_rules = rule_weights.shape[0]
+    cdef Py_ssize_t num_unsat = 0
+    cdef Py_ssize_t ground_rule_index, other_rule_index, last_rule_index, position
+    cdef Py_ssize_t start, end, rule_start, rule_end, i, j
+    cdef int atom_index, flip_atom_index, value_delta
+    cdef long long weighted_sum, new_sum
+    cdef long flip
+    cdef double total_loss = 0.0
+    cdef double loss, flip_delta, flip_atom_delta
+
+    rng_random = rng.random
+    rng_randbelow = rng._randbelow
+
+    for ground_rule_index in range(num_rules):
+        start = rule_atom_ptr[ground_rule_index]
+        end = rule_atom_ptr[ground_rule_index + 1]
+
+        weighted_sum = 0
+        for i in range(start, end):
+            weighted_sum += rule_coefs[i] * atom_values[rule_atoms[i]]
+        rule_sums[ground_rule_index] = weighted_sum
+
+        unsat_positions[ground_rule_index] = -1
+
+        if (rule_min_sums[ground_rule_index] <= weighted_sum <= rule_max_sums[ground_rule_index]):
+            rule_losses[ground_rule_index] = 0.0
+            continue
+
+        rule_losses[ground_rule_index] = rule_weights[ground_rule_index]
+        total_loss += rule_weights[ground_rule_index]
+
+        # Ground rules without any unobserved atoms cannot be changed by a flip, so they are never picked.
+        if (end > start):
+            unsat_positions[ground_rule_index] = num_unsat
+            unsat_rules[num_unsat] = ground_rule_index
+            num_unsat += 1
+
+    print("MLN Inference - Attempt: %d, Iteration 0, Loss: %f, Max Flips: %d." % (attempt, total_loss, max_flips))
+
+    for flip in range(1, max_flips + 1):
+        final_flip[0] = flip
+
+        if (num_unsat == 0):
+            print("Full satisfaction found.")
+            break
+
+        # Pick a random unsatisfied ground rule.
+        ground_rule_index = unsat_rules[<Py_ssize_t> rng_randbelow(num_unsat)]
+        rule_start = rule_atom_ptr[ground_rule_index]
+        rule_end = rule_atom_ptr[ground_rule_index + 1]
+
+        # Flip a coin.
+        # On heads, flip a random atom in the ground rule.
+        # On tails, flip the atom that leads to the most satisfaction.
+        # When the rule only has one atom, both options are the same move.
+        if (rule_end - rule_start == 1):
+            flip_atom_index = rule_atoms[rule_start]
+        elif (<double> rng_random() < noise):
+            flip_atom_index = rule_atoms[rule_start + <Py_ssize_t> rng_randbelow(rule_end - rule_start)]
+        else:
+            flip_atom_index = -1
+            flip_atom_delta = 0.0
+
+            for i in range(rule_start, rule_end):
+                atom_index = rule_atoms[i]
+
+                # The change in the atom's value: +1 (0 -> 1) or -1 (1 -> 0).
+                value_delta = 1 - 2 * atom_values[atom_index]
+
+                flip_delta = 0.0
+                for j in range(atom_rule_ptr[atom_index], atom_rule_ptr[atom_index + 1]):
+                    other_rule_index = atom_rules[j]
+                    new_sum = rule_sums[other_rule_index] + (atom_rule_coefs[j] * value_delta)
+                    if (rule_min_sums[other_rule_index] <= new_sum <= rule_max_sums[other_rule_index]):
+                        flip_delta += rule_losses[other_rule_index]
+                    else:
+                        flip_delta += rule_losses[other_rule_index] - rule_weights[other_rule_index]
+
+                if (flip_atom_index == -1 or flip_delta > flip_atom_delta):
+                    flip_atom_delta = flip_delta
+                    flip_atom_index = atom_index
+
+        # Commit the flip and update the cached sums and losses.
+        value_delta = 1 - 2 * atom_values[flip_atom_index]
+        atom_values[flip_atom_index] ^= 1
+
+        for j in range(atom_rule_ptr[flip_atom_index], atom_rule_ptr[flip_atom_index + 1]):
+            other_rule_index = atom_rules[j]
+            new_sum = rule_sums[other_rule_index] + (atom_rule_coefs[j] * value_delta)
+            rule_sums[other_rule_index] = new_sum
+
+            if (rule_min_sums[other_rule_index] <= new_sum <= rule_max_sums[other_rule_index]):
+                loss = 0.0
+            else:
+                loss = rule_weights[other_rule_index]
+
+            total_loss += loss - rule_losses[other_rule_index]
+            rule_losses[other_rule_index] = loss
+
+            position = unsat_positions[other_rule_index]
+            if (loss > 0.0 and position == -1):
+                unsat_positions[other_rule_index] = num_unsat
+                unsat_rules[num_unsat] = other_rule_index
+                num_unsat += 1
+            elif (loss == 0.0 and position != -1):
+                # Swap with the last unsatisfied rule and pop.
+                last_rule_index = unsat_rules[num_unsat - 1]
+                unsat_rules[position] = last_rule_index
+                unsat_positions[last_rule_index] = position
+                unsat_positions[other_rule_index] = -1
+                num_unsat -= 1
+
+        if (flip % log_mod == 0):
+            print("MLN Inference - Attempt: %d, Iteration %d, Loss: %f." % (attempt, flip, total_loss))
+
+    return total_loss
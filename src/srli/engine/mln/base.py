@@ -41,39 +41,38 @@ class BaseMLN(srli.engine.base.BaseEngine):
     def reason(self, ground_rules, atoms, **kwargs):
         pass
 
-    def _get_initial_atom_value(self, relation):
-        if (relation.has_negative_prior_weight()):
-            return int(self._rng.random() < relation.get_negative_prior_weight())
+    def _sample_atom_value(self, negative_prior_weight):
+        if (negative_prior_weight is not None):
+            return int(self._rng.random() < negative_prior_weight)
 
         return self._rng.randint(0, 1)
 
     def _create_results(self, atom_values, atoms):
         results = {}
 
-        # {(atom arg, ...): atom_index, ...}
-        atom_map = {tuple(atom['arguments']) : atom_index for (atom_index, atom) in atoms.items()}
+        # Only unobserved atoms can have values, and each relation only needs to look at its own atoms.
+        # {relation: {(atom arg, ...): value, ...}, ...}
+        value_maps = {relation : {} for relation in self._relations}
+        for (atom_index, value) in atom_values.items():
+            atom = atoms.get(atom_index)
+            if ((atom is None) or (atom['observed'])):
+                continue
+
+            value_maps[atom['relation']][tuple(atom['arguments'])] = value
 
         for relation in self._relations:
             if (not relation.has_unobserved_data()):
                 continue
 
             data = relation.get_unobserved_data()
+            value_map = value_maps[relation]
+            negative_prior_weight = relation.get_negative_prior_weight()
 
-            values = []
-
-            for row in data:
-                key = tuple(row)
-
-                if ((key in atom_map) and (atom_map[key] in atom_values)):
-                    value = atom_values[atom_map[key]]
-                else:
-                    # An atom not participating in any used ground rules just get a default value.
-                    # This means it appears in ground rules that are not: trivial, priors, or sum constraints.
-                    value = self._get_initial_atom_value(relation)
-
-                values.append(list(row) + [value])
-
-            results[relation] = values
+            # An atom not participating in any used ground rules just get a default value.
+            # This means it appears in ground rules that are not: trivial, priors, or sum constraints.
+            values = [value_map.get(tuple(row)) for row in data]
+            results[relation] = [list(row) + [self._sample_atom_value(negative_prior_weight) if (value is None) else value]
+                    for (row, value) in zip(data, values)]
 
         return results
 
@@ -90,7 +89,12 @@ class BaseMLN(srli.engine.base.BaseEngine):
         ground_atoms = {}
         ground_rules = []
 
+        # Structurally identical ground rules are merged (their weights are summed).
+        # {key: ground rule index, ...}
+        rule_keys = {}
+
         relation_map = {relation.name().upper() : relation for relation in self._relations}
+        rule_weights = [rule.weight() for rule in self._rules]
 
         for (atom_index_str, atom_info) in ground_program['atoms'].items():
             atom_info['relation'] = relation_map[atom_info['predicate']]
@@ -102,13 +106,13 @@ class BaseMLN(srli.engine.base.BaseEngine):
                     weight = atom_info['relation'].get_negative_prior_weight()
                     if (weight is None):
                         weight = HARD_WEIGHT
-                    ground_rules.append(GroundRule(NEGATIVE_PRIOR_RULE_INDEX, weight, [int(atom_index_str)], [-1], 0, '|'))
+                    self._add_ground_rule(ground_rules, rule_keys, GroundRule(NEGATIVE_PRIOR_RULE_INDEX, weight, [int(atom_index_str)], [-1], 0, '|'))
 
 
         for raw_ground_rule in ground_program['groundRules']:
             rule_index = raw_ground_rule['ruleIndex']
             operator = raw_ground_rule['operator']
-            weight = self._rules[rule_index].weight()
+            weight = rule_weights[rule_index]
             constant = int(raw_ground_rule['constant'])
 
             raw_coefficients = raw_ground_rule['coefficients']
@@ -146,14 +150,43 @@ class BaseMLN(srli.engine.base.BaseEngine):
             if (skip):
                 continue
 
-            ground_rule = GroundRule(rule_index, weight, atoms, coefficients, constant, operator)
-
-            ground_rule_index = len(ground_rules)
-            ground_rules.append(ground_rule)
+            self._add_ground_rule(ground_rules, rule_keys, GroundRule(rule_index, weight, atoms, coefficients, constant, operator))
 
         return ground_rules, ground_atoms
 
+    def _add_ground_rule(self, ground_rules, rule_keys, ground_rule):
+        """
+        Add a ground rule, or if a structurally identical rule (same operator, atoms, and coefficients)
+        has already been added, add this rule's weight to that rule instead.
+        """
+
+        terms = sorted(zip(ground_rule.atoms, ground_rule.coefficients))
+
+        # The constant only matters for arithmetic rules.
+        # An arithmetic rule is the same rule when both sides are negated (e.g. a - b = 0 and b - a = 0),
+        # so its key always has a positive first coefficient.
+        constant = None
+        if (ground_rule.operator != '|'):
+            constant = ground_rule.constant
+            if ((len(terms) > 0) and (terms[0][1] < 0)):
+                terms = [(atom, -coefficient) for (atom, coefficient) in terms]
+                constant = -constant
+
+        key = (ground_rule.operator, constant, tuple(terms))
+
+        if (key in rule_keys):
+            ground_rules[rule_keys[key]].weight += ground_rule.weight
+            return
+
+        rule_keys[key] = len(ground_rules)
+        ground_rules.append(ground_rule)
+
 class GroundRule(object):
+    """
+    A ground rule over binary atoms.
+    Inference engines evaluate rules from their own flattened copies (see NativeMLN._flatten_rules()).
+    """
+
     def __init__(self, rule_index, weight, atoms, coefficients, constant, operator):
         self.rule_index = rule_index
         self.weight = weight
@@ -165,36 +198,16 @@ class GroundRule(object):
         # TODO(eriq): Standardize and support logical and arithmetic rules.
         assert operator in ['|', '='], "Unsupported rule operator: '%s'." % (operator)
 
-    def loss(self, atom_values):
-        if (self.operator == '|'):
-            loss = self._loss_logical(atom_values)
+        # The range of weighted sums (sum of coefficient * atom value) for which this rule is satisfied.
+        # A logical rule is satisfied when any atom matches its coefficient,
+        # which is when the sum is at least 1 - (the number of negated atoms).
+        # An arithmetic rule is satisfied when the sum equals the constant.
+        if (operator == '|'):
+            self.min_satisfied_sum = 1 - coefficients.count(-1)
+            self.max_satisfied_sum = coefficients.count(1)
         else:
-            loss = self._loss_arithmetic(atom_values)
-
-        return self.weight * loss
-
-    def _loss_logical(self, atom_values):
-        for i in range(len(self.atoms)):
-            truth_value = int(atom_values[self.atoms[i]])
-            coefficient = self.coefficients[i]
-
-            # If any atom matches the coefficient, then no loss is incured.
-            if ((math.isclose(coefficient, -1.0) and math.isclose(truth_value, 0.0))
-                    or (math.isclose(coefficient, 1.0) and math.isclose(truth_value, 1.0))):
-                return 0.0
-
-        return 1.0
-
-    def _loss_arithmetic(self, atom_values):
-        sum = 0.0
-
-        for i in range(len(self.atoms)):
-            sum += self.coefficients[i] * atom_values[self.atoms[i]]
-
-        if (math.isclose(sum, self.constant)):
-            return 0.0
-
-        return 1.0
+            self.min_satisfied_sum = constant
+            self.max_satisfied_sum = constant
 
     def __repr__(self):
         return "Weight: %f, Operator: %s, Constant: %d, Coefficients: [%s], Atoms: [%s]." % (self.weight, self.operator, self.constant, ', '.join(map(str, self.coefficients)), ', '.join(map(str, self.atoms)))
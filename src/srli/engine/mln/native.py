@@ -1,33 +1,52 @@
+import array
 import math
 
 import srli.engine.mln.base
 
+# The compiled walk is optional, it is only built when Cython is available at install time.
+try:
+    import srli.engine.mln._walksat
+    HAS_COMPILED_WALKSAT = True
+except ImportError:
+    HAS_COMPILED_WALKSAT = False
+
 DEFAULT_MAX_TRIES = 3
 DEFAULT_NOISE = 0.05
-LOG_MOD = 50
+LOG_MOD = 1000
 FLIP_MULTIPLIER = 2
 
 class NativeMLN(srli.engine.mln.base.BaseMLN):
     """
     A basic implementation of MLNs with inference using MaxWalkSat.
     If unspecified, the number of flips defaults to FLIP_MULTIPLIER x the number of unobserved atoms (similar to Tuffy).
+    If the compiled walk (srli.engine.mln._walksat) is built, it is used unless reason() is passed compiled = False.
     """
 
     def __init__(self, relations, rules, **kwargs):
         super().__init__(relations, rules, **kwargs)
 
-    def reason(self, ground_rules, atoms, max_flips = None, max_tries = DEFAULT_MAX_TRIES, noise = DEFAULT_NOISE, **kwargs):
-        atom_rule_map = self._map_atoms(ground_rules)
+    def reason(self, ground_rules, atoms, max_flips = None, max_tries = DEFAULT_MAX_TRIES, noise = DEFAULT_NOISE, compiled = True, **kwargs):
+        atom_indexes, atom_rule_ptr, atom_rules, atom_rule_coefs = self._index_atoms(ground_rules)
+        atom_priors = self._get_atom_priors(atom_indexes, atoms)
+        rule_arrays = self._flatten_rules(ground_rules)
+
+        compiled_arrays = None
+        if (compiled and HAS_COMPILED_WALKSAT):
+            compiled_arrays = self._get_compiled_arrays(rule_arrays, atom_rule_ptr, atom_rules, atom_rule_coefs)
 
         if (max_flips is None):
-            max_flips = FLIP_MULTIPLIER * len(atom_rule_map)
+            max_flips = FLIP_MULTIPLIER * len(atom_indexes)
 
         best_atom_values = None
         best_total_loss = None
         best_attempt = None
 
         for attempt in range(1, max_tries + 1):
-            atom_values, total_loss = self._inference_attempt(attempt, max_flips, noise, ground_rules, atoms, atom_rule_map)
+            if (compiled_arrays is not None):
+                atom_values, total_loss = self._compiled_inference_attempt(attempt, max_flips, noise, compiled_arrays, atom_priors)
+            else:
+                atom_values, total_loss = self._inference_attempt(attempt, max_flips, noise, rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
             if (best_total_loss is None or total_loss < best_total_loss):
                 best_total_loss = total_loss
                 best_atom_values = atom_values
@@ -38,62 +57,126 @@ class NativeMLN(srli.engine.mln.base.BaseMLN):
 
         print("MLN Inference Complete - Best Attempt: %d, Loss: %f." % (best_attempt, best_total_loss))
 
-        return best_atom_values
+        return {atom_indexes[atom_index] : best_atom_values[atom_index] for atom_index in range(len(atom_indexes))}
+
+    def _inference_attempt(self, attempt, max_flips, noise, rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs):
+        rule_atoms, rule_atom_ptr, rule_coefs, rule_weights, rule_min_sums, rule_max_sums = rule_arrays
+        num_rules = len(rule_weights)
+
+        # One byte (0 or 1) per atom.
+        atom_values = bytearray([self._sample_atom_value(prior) for prior in atom_priors])
+
+        # The weighted sum of atoms and loss for each ground rule are cached,
+        # and only updated for the rules that an atom participates in when it flips.
+        # A rule is satisfied when its sum is in [rule_min_sums[i], rule_max_sums[i]].
+        rule_sums = [0] * num_rules
+        rule_losses = [0.0] * num_rules
+
+        # The unsatisfied rules, and the position of each rule in that list (-1 if not in the list).
+        # Ground rules without any unobserved atoms cannot be changed by a flip, so they are never picked.
+        unsat_rules = []
+        unsat_positions = [-1] * num_rules
+
+        for ground_rule_index in range(num_rules):
+            start = rule_atom_ptr[ground_rule_index]
+            end = rule_atom_ptr[ground_rule_index + 1]
+
+            weighted_sum = 0
+            for (atom_index, coefficient) in zip(rule_atoms[start:end], rule_coefs[start:end]):
+                weighted_sum += coefficient * atom_values[atom_index]
+            rule_sums[ground_rule_index] = weighted_sum
+
+            if (rule_min_sums[ground_rule_index] <= weighted_sum <= rule_max_sums[ground_rule_index]):
+                continue
+
+            rule_losses[ground_rule_index] = rule_weights[ground_rule_index]
 
-    def _inference_attempt(self, attempt, max_flips, noise, ground_rules, atoms, atom_rule_map):
-        atom_values = {}
-        for atom_index in atom_rule_map:
-            atom_values[atom_index] = self._get_initial_atom_value(atoms[atom_index]['relation'])
+            if (end > start):
+                unsat_positions[ground_rule_index] = len(unsat_rules)
+                unsat_rules.append(ground_rule_index)
 
-        total_loss = 0.0
-        for ground_rule in ground_rules:
-            total_loss += ground_rule.loss(atom_values)
+        total_loss = sum(rule_losses)
+
+        # Bind the RNG methods used in the flip loop to skip the attribute lookups.
+        # _randbelow(n) is what randrange(n) calls after validating its arguments.
+        rng_random = self._rng.random
+        rng_randbelow = self._rng._randbelow
 
         print("MLN Inference - Attempt: %d, Iteration 0, Loss: %f, Max Flips: %d." % (attempt, total_loss, max_flips))
 
         flip = 1
         for flip in range(1, max_flips + 1):
-            if (math.isclose(total_loss, 0.0)):
+            if (len(unsat_rules) == 0):
                 print("Full satisfaction found.")
                 break
 
             # Pick a random unsatisfied ground rule.
-            ground_rule_index = None
-            while (ground_rule_index is None or math.isclose(ground_rules[ground_rule_index].loss(atom_values), 0.0)):
-                ground_rule_index = self._rng.randint(0, len(ground_rules) - 1)
+            ground_rule_index = unsat_rules[rng_randbelow(len(unsat_rules))]
+            rule_start = rule_atom_ptr[ground_rule_index]
+            rule_end = rule_atom_ptr[ground_rule_index + 1]
 
             # Flip a coin.
             # On heads, flip a random atom in the ground rule.
             # On tails, flip the atom that leads to the most satisfaction.
-            if (self._rng.random() < noise):
-                flip_atom_index = self._rng.choice(ground_rules[ground_rule_index].atoms)
-                atom_values[flip_atom_index] = 1.0 - atom_values[flip_atom_index]
+            # When the rule only has one atom, both options are the same move.
+            if (rule_end - rule_start == 1):
+                flip_atom_index = rule_atoms[rule_start]
+            elif (rng_random() < noise):
+                flip_atom_index = rule_atoms[rule_start + rng_randbelow(rule_end - rule_start)]
             else:
                 flip_atom_index = None
-                flip_atom_loss = None
-
-                # Compute the possible loss for flipping each atom.
-                for atom_index in ground_rules[ground_rule_index].atoms:
-                    old_atom_loss = 0.0
-                    for ground_rule_index in atom_rule_map[atom_index]:
-                        old_atom_loss += ground_rules[ground_rule_index].loss(atom_values)
-
-                    new_atom_loss = 0.0
-                    atom_values[atom_index] = 1.0 - atom_values[atom_index]
-                    for ground_rule_index in atom_rule_map[atom_index]:
-                        new_atom_loss += ground_rules[ground_rule_index].loss(atom_values)
-                    atom_values[atom_index] = 1.0 - atom_values[atom_index]
-
-                    flip_delta = old_atom_loss - new_atom_loss
-                    if (flip_atom_index is None or flip_delta > flip_atom_loss):
-                        flip_atom_loss = flip_delta
+                flip_atom_delta = None
+
+                # Compute the change in loss for flipping each atom (only the rules the atom participates in can change).
+                for atom_index in rule_atoms[rule_start:rule_end]:
+                    # The change in the atom's value: +1 (0 -> 1) or -1 (1 -> 0).
+                    value_delta = 1 - 2 * atom_values[atom_index]
+
+                    start = atom_rule_ptr[atom_index]
+                    end = atom_rule_ptr[atom_index + 1]
+
+                    flip_delta = 0.0
+                    for (other_rule_index, coefficient) in zip(atom_rules[start:end], atom_rule_coefs[start:end]):
+                        new_sum = rule_sums[other_rule_index] + (coefficient * value_delta)
+                        if (rule_min_sums[other_rule_index] <= new_sum <= rule_max_sums[other_rule_index]):
+                            flip_delta += rule_losses[other_rule_index]
+                        else:
+                            flip_delta += rule_losses[other_rule_index] - rule_weights[other_rule_index]
+
+                    if (flip_atom_index is None or flip_delta > flip_atom_delta):
+                        flip_atom_delta = flip_delta
                         flip_atom_index = atom_index
 
-                atom_values[flip_atom_index] = 1.0 - atom_values[flip_atom_index]
+            # Commit the flip and update the cached sums and losses.
+            value_delta = 1 - 2 * atom_values[flip_atom_index]
+            atom_values[flip_atom_index] ^= 1
 
-            total_loss = 0.0
-            for ground_rule in ground_rules:
-                total_loss += ground_rule.loss(atom_values)
+            start = atom_rule_ptr[flip_atom_index]
+            end = atom_rule_ptr[flip_atom_index + 1]
+
+            for (other_rule_index, coefficient) in zip(atom_rules[start:end], atom_rule_coefs[start:end]):
+                new_sum = rule_sums[other_rule_index] + (coefficient * value_delta)
+                rule_sums[other_rule_index] = new_sum
+
+                if (rule_min_sums[other_rule_index] <= new_sum <= rule_max_sums[other_rule_index]):
+                    loss = 0.0
+                else:
+                    loss = rule_weights[other_rule_index]
+
+                total_loss += loss - rule_losses[other_rule_index]
+                rule_losses[other_rule_index] = loss
+
+                position = unsat_positions[other_rule_index]
+                if ((loss > 0.0) and (position == -1)):
+                    unsat_positions[other_rule_index] = len(unsat_rules)
+                    unsat_rules.append(other_rule_index)
+                elif ((loss == 0.0) and (position != -1)):
+                    # Swap with the last unsatisfied rule and pop.
+                    last_rule_index = unsat_rules.pop()
+                    if (last_rule_index != other_rule_index):
+                        unsat_rules[position] = last_rule_index
+                        unsat_positions[last_rule_index] = position
+                    unsat_positions[other_rule_index] = -1
 
             if (flip % LOG_MOD == 0):
                 print("MLN Inference - Attempt: %d, Iteration %d, Loss: %f." % (attempt, flip, total_loss))
@@ -102,13 +185,117 @@ class NativeMLN(srli.engine.mln.base.BaseMLN):
 
         return atom_values, total_loss
 
-    def _map_atoms(self, ground_rules):
-        atom_rule_map = {}
+    def _compiled_inference_attempt(self, attempt, max_flips, noise, compiled_arrays, atom_priors):
+        # One byte (0 or 1) per atom.
+        atom_values = bytearray([self._sample_atom_value(prior) for prior in atom_priors])
+
+        total_loss, flip = srli.engine.mln._walksat.walksat(*compiled_arrays, atom_values, max_flips, noise, self._rng, attempt, LOG_MOD)
+
+        print("MLN Inference Attempt Complete - Attempt: %d, Iteration %d, Loss: %f." % (attempt, flip, total_loss))
+
+        return atom_values, total_loss
+
+    def _get_compiled_arrays(self, rule_arrays, atom_rule_ptr, atom_rules, atom_rule_coefs):
+        """
+        Convert the flattened rules and atom CSR lists into the typed buffers used by the compiled walk.
+        """
+
+        rule_atoms, rule_atom_ptr, rule_coefs, rule_weights, rule_min_sums, rule_max_sums = rule_arrays
+
+        return (
+            array.array('i', rule_atoms),
+            array.array('i', rule_atom_ptr),
+            array.array('i', rule_coefs),
+            array.array('d', rule_weights),
+            array.array('q', rule_min_sums),
+            array.array('q', rule_max_sums),
+            array.array('i', atom_rules),
+            array.array('i', atom_rule_ptr),
+            array.array('i', atom_rule_coefs),
+        )
+
+    def _flatten_rules(self, ground_rules):
+        """
+        Flatten the ground rules (which should already be using dense atom indexes) into parallel arrays (one entry per rule),
+        where the atoms and coefficients for rule i are rule_atoms[rule_atom_ptr[i]:rule_atom_ptr[i + 1]] (and the same slice of rule_coefs).
+        Rule i is satisfied when the weighted sum of its atoms is in [rule_min_sums[i], rule_max_sums[i]].
+
+        Returns:
+            (rule_atoms, rule_atom_ptr, rule_coefs, rule_weights, rule_min_sums, rule_max_sums)
+        """
+
+        rule_atoms = []
+        rule_atom_ptr = [0] * (len(ground_rules) + 1)
+        rule_coefs = []
+
+        for ground_rule_index in range(len(ground_rules)):
+            rule_atoms += ground_rules[ground_rule_index].atoms
+            rule_coefs += ground_rules[ground_rule_index].coefficients
+            rule_atom_ptr[ground_rule_index + 1] = len(rule_atoms)
+
+        rule_weights = [ground_rule.weight for ground_rule in ground_rules]
+        rule_min_sums = [ground_rule.min_satisfied_sum for ground_rule in ground_rules]
+        rule_max_sums = [ground_rule.max_satisfied_sum for ground_rule in ground_rules]
+
+        return rule_atoms, rule_atom_ptr, rule_coefs, rule_weights, rule_min_sums, rule_max_sums
+
+    def _index_atoms(self, ground_rules):
+        """
+        Assign each atom used in a ground rule a dense index (its position in the atom values),
+        rewrite the ground rules to use these indexes,
+        and build a CSR mapping of atoms to the ground rules they participate in along with the atom's coefficient in that rule
+        (the rules for atom i are atom_rules[atom_rule_ptr[i]:atom_rule_ptr[i + 1]], and the same slice of atom_rule_coefs).
+
+        Returns:
+            [original atom index, ...]
+            atom_rule_ptr: [int, ...]
+            atom_rules: [ground rule index, ...]
+            atom_rule_coefs: [coefficient, ...]
+        """
+
+        # {original atom index: dense atom index, ...}
+        atom_map = {}
+        atom_indexes = []
+        atom_rule_map = []
+        atom_coef_map = []
 
         for ground_rule_index in range(len(ground_rules)):
-            for atom_index in ground_rules[ground_rule_index].atoms:
-                if (atom_index not in atom_rule_map):
-                    atom_rule_map[atom_index] = []
-                atom_rule_map[atom_index].append(ground_rule_index)
+            ground_rule = ground_rules[ground_rule_index]
+            dense_atoms = []
+
+            for (atom_index, coefficient) in zip(ground_rule.atoms, ground_rule.coefficients):
+                if (atom_index not in atom_map):
+                    atom_map[atom_index] = len(atom_indexes)
+                    atom_indexes.append(atom_index)
+                    atom_rule_map.append([])
+                    atom_coef_map.append([])
+
+                dense_index = atom_map[atom_index]
+                dense_atoms.append(dense_index)
+
+                # An atom that appears multiple times in a rule only maps to that rule once (with the total coefficient).
+                if ((len(atom_rule_map[dense_index]) == 0) or (atom_rule_map[dense_index][-1] != ground_rule_index)):
+                    atom_rule_map[dense_index].append(ground_rule_index)
+                    atom_coef_map[dense_index].append(coefficient)
+                else:
+                    atom_coef_map[dense_index][-1] += coefficient
+
+            ground_rule.atoms = dense_atoms
+
+        atom_rule_ptr = [0] * (len(atom_indexes) + 1)
+        atom_rules = []
+        atom_rule_coefs = []
+
+        for atom_index in range(len(atom_indexes)):
+            atom_rules += atom_rule_map[atom_index]
+            atom_rule_coefs += atom_coef_map[atom_index]
+            atom_rule_ptr[atom_index + 1] = len(atom_rules)
+
+        return atom_indexes, atom_rule_ptr, atom_rules, atom_rule_coefs
+
+    def _get_atom_priors(self, atom_indexes, atoms):
+        """
+        Get the negative prior weight (or None) for each dense atom.
+        """
 
-        return atom_rule_map
+        return [atoms[atom_index]['relation'].get_negative_prior_weight() for atom_index in atom_indexes]
@@ -0,0 +1,207 @@
+import numba
+import numpy
+
+import srli.engine.mln.native
+
+class NumbaMLN(srli.engine.mln.native.NativeMLN):
+    """
+    An implementation of MLNs with inference using MaxWalkSat, where the walk is JIT compiled with Numba.
+    The ground rules are flattened into CSR arrays (rule -> atoms and atom -> rules) that are handed to the compiled walk.
+    """
+
+    def __init__(self, relations, rules, **kwargs):
+        super().__init__(relations, rules, **kwargs)
+
+    def reason(self, ground_rules, atoms, max_flips = None, max_tries = None,
+            noise = srli.engine.mln.native.DEFAULT_NOISE, **kwargs):
+        """
+        All attempts are independent walks that are run in parallel.
+        If unspecified, the number of attempts defaults to the number of Numba threads,
+        but never fewer than NativeMLN's default number of attempts.
+        """
+
+        atom_indexes, atom_rule_ptr, atom_rules, atom_rule_coefs = self._index_atoms(ground_rules)
+        atom_priors = self._get_atom_priors(atom_indexes, atoms)
+        rule_arrays = self._build_arrays(ground_rules, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
+        if (max_flips is None):
+            max_flips = srli.engine.mln.native.FLIP_MULTIPLIER * len(atom_indexes)
+
+        if (max_tries is None):
+            max_tries = max(srli.engine.mln.native.DEFAULT_MAX_TRIES, numba.get_num_threads())
+
+        # [attempt, atom]
+        atom_values = numpy.zeros((max_tries, len(atom_indexes)), dtype = numpy.uint8)
+        for attempt in range(max_tries):
+            for atom_index in range(len(atom_indexes)):
+                atom_values[attempt][atom_index] = self._sample_atom_value(atom_priors[atom_index])
+
+        seeds = numpy.array([self._rng.randint(0, 2 ** 31) for attempt in range(max_tries)], dtype = numpy.int64)
+        total_losses = numpy.zeros(max_tries, dtype = numpy.float64)
+
+        _multi_walk(*rule_arrays, atom_values, max_flips, noise, seeds, total_losses)
+
+        for attempt in range(max_tries):
+            print("MLN Inference Attempt Complete - Attempt: %d, Loss: %f." % (attempt + 1, total_losses[attempt]))
+
+        best_attempt = int(numpy.argmin(total_losses))
+        best_atom_values = atom_values[best_attempt]
+
+        print("MLN Inference Complete - Best Attempt: %d, Loss: %f." % (best_attempt + 1, total_losses[best_attempt]))
+
+        return {atom_indexes[atom_index] : int(best_atom_values[atom_index]) for atom_index in range(len(atom_indexes))}
+
+    def _build_arrays(self, ground_rules, atom_rule_ptr, atom_rules, atom_rule_coefs):
+        """
+        Convert the flattened ground rules (see NativeMLN._flatten_rules()) and atom CSR lists into NumPy arrays.
+
+        Returns:
+            (rule_atoms, rule_atom_ptr, rule_coef, rule_weight, rule_min_sum, rule_max_sum, atom_rules, atom_rule_ptr, atom_rule_coef)
+        """
+
+        rule_atoms, rule_atom_ptr, rule_coefs, rule_weights, rule_min_sums, rule_max_sums = self._flatten_rules(ground_rules)
+
+        return (
+            numpy.array(rule_atoms, dtype = numpy.int32),
+            numpy.array(rule_atom_ptr, dtype = numpy.int32),
+            numpy.array(rule_coefs, dtype = numpy.int32),
+            numpy.array(rule_weights, dtype = numpy.float64),
+            numpy.array(rule_min_sums, dtype = numpy.int64),
+            numpy.array(rule_max_sums, dtype = numpy.int64),
+            numpy.array(atom_rules, dtype = numpy.int32),
+            numpy.array(atom_rule_ptr, dtype = numpy.int32),
+            numpy.array(atom_rule_coefs, dtype = numpy.int32),
+        )
+
+@numba.njit(cache = True)
+def _loss_from_sum(rule_index, weighted_sum, rule_weight, rule_min_sum, rule_max_sum):
+    """
+    Compute the loss for a rule given the weighted sum of its atoms.
+    """
+
+    if (rule_min_sum[rule_index] <= weighted_sum and weighted_sum <= rule_max_sum[rule_index]):
+        return 0.0
+
+    return rule_weight[rule_index]
+
+@numba.njit(cache = True, parallel = True)
+def _multi_walk(rule_atoms, rule_atom_ptr, rule_coef, rule_weight, rule_min_sum, rule_max_sum, atom_rules, atom_rule_ptr, atom_rule_coef,
+        atom_values, max_flips, noise, seeds, total_losses):
+    """
+    Run independent MaxWalkSat attempts in parallel, one per row of atom_values.
+    The final loss for each attempt is written into total_losses.
+    As soon as any attempt satisfies all its (fixable) rules, the other attempts stop (best-effort, no lock is needed).
+    """
+
+    stop = numpy.zeros(1, dtype = numpy.int32)
+
+    for attempt in numba.prange(len(seeds)):
+        total_losses[attempt] = _walksat(rule_atoms, rule_atom_ptr, rule_coef, rule_weight, rule_min_sum, rule_max_sum,
+                atom_rules, atom_rule_ptr, atom_rule_coef, atom_values[attempt], max_flips, noise, seeds[attempt], stop)
+
+@numba.njit(cache = True)
+def _walksat(rule_atoms, rule_atom_ptr, rule_coef, rule_weight, rule_min_sum, rule_max_sum, atom_rules, atom_rule_ptr, atom_rule_coef,
+        atom_values, max_flips, noise, seed, stop):
+    """
+    Run a single MaxWalkSat attempt, flipping atom_values in place.
+    The attempt ends early if another attempt sets stop[0] (and sets it itself when all fixable rules are satisfied).
+    Returns the total loss of the final atom values.
+    """
+
+    numpy.random.seed(seed)
+
+    num_rules = len(rule_weight)
+
+    # The weighted sum of atoms and loss for each ground rule are cached,
+    # and only updated for the rules that an atom participates in when it flips.
+    rule_sums = numpy.zeros(num_rules, dtype = numpy.int64)
+    rule_losses = numpy.zeros(num_rules, dtype = numpy.float64)
+
+    # The unsatisfied (and fixable) rules, and the position of each rule in that list (-1 if not in the list).
+    unsat_rules = numpy.zeros(num_rules, dtype = numpy.int32)
+    unsat_positions = numpy.full(num_rules, -1, dtype = numpy.int32)
+    num_unsat = 0
+
+    total_loss = 0.0
+    for rule_index in range(num_rules):
+        for i in range(rule_atom_ptr[rule_index], rule_atom_ptr[rule_index + 1]):
+            rule_sums[rule_index] += rule_coef[i] * atom_values[rule_atoms[i]]
+
+        loss = _loss_from_sum(rule_index, rule_sums[rule_index], rule_weight, rule_min_sum, rule_max_sum)
+        rule_losses[rule_index] = loss
+        total_loss += loss
+
+        # Ground rules without any unobserved atoms cannot be changed by a flip, so they are never picked.
+        if (loss > 0.0 and rule_atom_ptr[rule_index + 1] > rule_atom_ptr[rule_index]):
+            unsat_rules[num_unsat] = rule_index
+            unsat_positions[rule_index] = num_unsat
+            num_unsat += 1
+
+    for flip in range(max_flips):
+        if (num_unsat == 0):
+            stop[0] = 1
+            break
+
+        if (stop[0] != 0):
+            break
+
+        # Pick a random unsatisfied ground rule.
+        rule_index = unsat_rules[numpy.random.randint(0, num_unsat)]
+        start = rule_atom_ptr[rule_index]
+        end = rule_atom_ptr[rule_index + 1]
+
+        # Flip a coin.
+        # On heads, flip a random atom in the ground rule.
+        # On tails, flip the atom that leads to the most satisfaction.
+        # When the rule only has one atom, both options are the same move.
+        if (end - start == 1):
+            flip_atom_index = rule_atoms[start]
+        elif (numpy.random.random() < noise):
+            flip_atom_index = rule_atoms[numpy.random.randint(start, end)]
+        else:
+            flip_atom_index = -1
+            flip_atom_delta = 0.0
+
+            for i in range(start, end):
+                atom_index = rule_atoms[i]
+
+                # The change in the atom's value: +1 (0 -> 1) or -1 (1 -> 0).
+                value_delta = 1 - 2 * numpy.int64(atom_values[atom_index])
+
+                flip_delta = 0.0
+                for j in range(atom_rule_ptr[atom_index], atom_rule_ptr[atom_index + 1]):
+                    other_rule_index = atom_rules[j]
+                    new_sum = rule_sums[other_rule_index] + atom_rule_coef[j] * value_delta
+                    flip_delta += rule_losses[other_rule_index] - _loss_from_sum(other_rule_index, new_sum,
+                            rule_weight, rule_min_sum, rule_max_sum)
+
+                if (flip_atom_index == -1 or flip_delta > flip_atom_delta):
+                    flip_atom_delta = flip_delta
+                    flip_atom_index = atom_index
+
+        # Commit the flip and update the cached sums and losses.
+        value_delta = 1 - 2 * numpy.int64(atom_values[flip_atom_index])
+        atom_values[flip_atom_index] = 1 - atom_values[flip_atom_index]
+
+        for j in range(atom_rule_ptr[flip_atom_index], atom_rule_ptr[flip_atom_index + 1]):
+            other_rule_index = atom_rules[j]
+            rule_sums[other_rule_index] += atom_rule_coef[j] * value_delta
+
+            loss = _loss_from_sum(other_rule_index, rule_sums[other_rule_index], rule_weight, rule_min_sum, rule_max_sum)
+            total_loss += loss - rule_losses[other_rule_index]
+            rule_losses[other_rule_index] = loss
+
+            position = unsat_positions[other_rule_index]
+            if (loss > 0.0 and position == -1):
+                unsat_rules[num_unsat] = other_rule_index
+                unsat_positions[other_rule_index] = num_unsat
+                num_unsat += 1
+            elif (loss == 0.0 and position != -1):
+                # Swap with the last unsatisfied rule and pop.
+                last_rule_index = unsat_rules[num_unsat - 1]
+                unsat_rules[position] = last_rule_index
+                unsat_positions[last_rule_index] = position
+                unsat_positions[other_rule_index] = -1
+                num_unsat -= 1
+
+    return total_loss
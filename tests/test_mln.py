@@ -0,0 +1,144 @@
+import importlib.util
+import random
+import unittest
+
+import srli.engine.mln.base
+import srli.engine.mln.native
+import srli.relation
+import tests.base
+
+class MLNTest(tests.base.BaseTest):
+    def test_create_results_shared_arguments(self):
+        # Atoms from different relations with the same arguments must keep their own values.
+        relation_a = srli.relation.Relation('A', arity = 1)
+        relation_b = srli.relation.Relation('B', arity = 1)
+
+        relation_a.add_unobserved_data(data = [['x'], ['y']])
+        relation_b.add_unobserved_data(data = [['x'], ['y']])
+
+        atoms = {
+            0: {'relation': relation_a, 'arguments': ['x'], 'observed': False},
+            1: {'relation': relation_b, 'arguments': ['x'], 'observed': False},
+            2: {'relation': relation_a, 'arguments': ['y'], 'observed': False},
+            3: {'relation': relation_b, 'arguments': ['y'], 'observed': False},
+        }
+        atom_values = {0: 1, 1: 0, 2: 0, 3: 1}
+
+        engine = srli.engine.mln.native.NativeMLN([relation_a, relation_b], [], seed = 4)
+        results = engine._create_results(atom_values, atoms)
+
+        self.assertEqual(results[relation_a], [['x', 1], ['y', 0]])
+        self.assertEqual(results[relation_b], [['x', 0], ['y', 1]])
+
+    def test_merge_ground_rules(self):
+        engine = srli.engine.mln.native.NativeMLN([], [], seed = 4)
+
+        ground_rules = []
+        rule_keys = {}
+
+        # A | !B, in any atom order and with any constant (the constant does not matter for logical rules).
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(0, 1.5, [1, 2], [1, -1], 0, '|'))
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(1, 2.0, [2, 1], [-1, 1], 3, '|'))
+
+        # !A | B is a different logical rule.
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(0, 0.5, [1, 2], [-1, 1], 0, '|'))
+
+        # A - B = 0 and B - A = 0 are the same arithmetic rule.
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(2, 1.0, [1, 2], [1, -1], 0, '='))
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(2, 4.0, [2, 1], [1, -1], 0, '='))
+
+        # A - B = 1 and B - A = -1 are the same, but different from A - B = 0.
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(2, 1.0, [1, 2], [1, -1], 1, '='))
+        engine._add_ground_rule(ground_rules, rule_keys, srli.engine.mln.base.GroundRule(2, 2.0, [1, 2], [-1, 1], -1, '='))
+
+        self.assertEqual(len(ground_rules), 4)
+        self.assertEqual([ground_rule.weight for ground_rule in ground_rules], [3.5, 0.5, 5.0, 3.0])
+
+    def test_python_walk(self):
+        # The Python walk is the fallback when the compiled walk is not built, so always check it directly.
+        for seed in range(5):
+            engine, ground_rules, arrays = self._make_walk(seed)
+            rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs = arrays
+
+            atom_values, total_loss = engine._inference_attempt(1, 200, 0.2, rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
+            self.assertClose(total_loss, self._total_loss(ground_rules, atom_values))
+
+    @unittest.skipUnless(srli.engine.mln.native.HAS_COMPILED_WALKSAT, "The compiled walk is not built.")
+    def test_compiled_walk_matches_python(self):
+        for seed in range(5):
+            engine, ground_rules, arrays = self._make_walk(seed)
+            rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs = arrays
+            compiled_arrays = engine._get_compiled_arrays(rule_arrays, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
+            engine._rng.seed(seed)
+            expected = engine._inference_attempt(1, 200, 0.2, rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
+            engine._rng.seed(seed)
+            actual = engine._compiled_inference_attempt(1, 200, 0.2, compiled_arrays, atom_priors)
+
+            self.assertEqual(expected, actual)
+
+    @unittest.skipUnless(importlib.util.find_spec('numba'), "Numba is not installed.")
+    def test_numba_walk(self):
+        import numpy
+        import srli.engine.mln.numba
+
+        num_tries = 3
+
+        for seed in range(5):
+            engine, ground_rules, arrays = self._make_walk(seed)
+            rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs = arrays
+
+            engine = srli.engine.mln.numba.NumbaMLN([], [], seed = seed)
+            numba_arrays = engine._build_arrays(ground_rules, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
+            atom_values = numpy.array([[engine._sample_atom_value(prior) for prior in atom_priors] for attempt in range(num_tries)], dtype = numpy.uint8)
+            seeds = numpy.array([seed * num_tries + attempt for attempt in range(num_tries)], dtype = numpy.int64)
+            total_losses = numpy.zeros(num_tries, dtype = numpy.float64)
+
+            srli.engine.mln.numba._multi_walk(*numba_arrays, atom_values, 200, 0.2, seeds, total_losses)
+
+            for attempt in range(num_tries):
+                self.assertClose(total_losses[attempt], self._total_loss(ground_rules, atom_values[attempt].tolist()))
+
+    def _make_walk(self, seed, num_atoms = 30, num_rules = 80):
+        """
+        Build a random mix of logical and arithmetic ground rules (including one without any atoms)
+        and the walk inputs for them.
+
+        Returns:
+            (engine, ground rules, (rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs))
+        """
+
+        rng = random.Random(seed)
+
+        ground_rules = [srli.engine.mln.base.GroundRule(0, 1.0, [], [], 1, '=')]
+        for rule_index in range(num_rules):
+            if (rng.random() < 0.2):
+                atoms = rng.sample(range(num_atoms), 2)
+                ground_rule = srli.engine.mln.base.GroundRule(rule_index, rng.random(), atoms, [1, -1], rng.choice([-1, 0, 1]), '=')
+            else:
+                atoms = rng.sample(range(num_atoms), rng.randint(1, 4))
+                coefficients = [rng.choice([-1, 1]) for atom in atoms]
+                ground_rule = srli.engine.mln.base.GroundRule(rule_index, rng.random(), atoms, coefficients, 0, '|')
+
+            ground_rules.append(ground_rule)
+
+        engine = srli.engine.mln.native.NativeMLN([], [], seed = seed)
+
+        atom_indexes, atom_rule_ptr, atom_rules, atom_rule_coefs = engine._index_atoms(ground_rules)
+        atom_priors = [rng.choice([None, 0.2]) for atom_index in atom_indexes]
+        rule_arrays = engine._flatten_rules(ground_rules)
+
+        return engine, ground_rules, (rule_arrays, atom_priors, atom_rule_ptr, atom_rules, atom_rule_coefs)
+
+    def _total_loss(self, ground_rules, atom_values):
+        total_loss = 0.0
+
+        for ground_rule in ground_rules:
+            weighted_sum = sum([coefficient * atom_values[atom] for (atom, coefficient) in zip(ground_rule.atoms, ground_rule.coefficients)])
+            if (not (ground_rule.min_satisfied_sum <= weighted_sum <= ground_rule.max_satisfied_sum)):
+                total_loss += ground_rule.weight
+
+        return total_loss
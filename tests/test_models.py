@@ -1,3 +1,4 @@
+import importlib.util
 import os
 
 import srli.engine
@@ -14,6 +15,10 @@ SKIP_PAIRS = [
     (tests.data.simpleacquaintances.model.SimpleAcquaintancesModel, srli.engine.Engine.ProbLog),
 ]
 
+# The Numba engine is only available with the optional numba extra (see setup.cfg).
+if (importlib.util.find_spec('numba') is None):
+    SKIP_PAIRS += [(model_class, srli.engine.Engine.MLN_Numba) for model_class in MODELS]
+
 class ModelTest(tests.base.BaseTest):
     pass
 